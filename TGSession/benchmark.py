@@ -0,0 +1,436 @@
+"""TG Session API 压测工具
+
+在进程内启动 API（uvicorn），用模拟的 TelegramClient 代替真实的 MTProto 连接，
+并发驱动 QR 登录、手机号登录和 V1 转 V2 流程，输出 JSON 格式的结果，便于对比多次运行：
+
+	cd TGSession
+	python benchmark.py --flows 1000 --scenario mixed --qr-wait 2 > result.json
+
+模拟客户端的各个环节（connect、qr_login().wait、send_code_request、sign_in）都可以配置延迟和失败率。
+
+--import-time N 只测量在全新进程中导入 api 模块的耗时（重复N次），用于对比冷启动和worker重启的开销。
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Tuple
+
+import uvicorn
+from telethon.crypto import AuthKey
+from telethon.errors import SessionPasswordNeededError
+from telethon.sessions import StringSession
+
+# 压测时默认只输出警告以上的API日志，避免日志混入结果
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+# 压测关注的是服务端容量，默认关闭限流和连接数上限（可通过环境变量重新开启）
+os.environ.setdefault("RATE_LIMIT_IP_RATE", "0")
+os.environ.setdefault("RATE_LIMIT_GLOBAL_RATE", "0")
+os.environ.setdefault("MAX_LIVE_CLIENTS", "0")
+
+try:
+	from . import api
+except ImportError:
+	import api
+
+# 模拟客户端连接后使用的DC（与Telethon默认DC一致）
+FAKE_DC = (2, "149.154.167.51", 443)
+
+class FakeBackend:
+	"""模拟Telegram服务端的行为：每个环节的延迟、抖动和失败率"""
+
+	def __init__(self, args: argparse.Namespace):
+		self.latency = {
+			"connect": args.connect_latency,
+			"qr_login.wait": args.qr_wait,
+			"send_code_request": args.send_code_latency,
+			"sign_in": args.sign_in_latency,
+		}
+		self.failure = {
+			"connect": args.connect_failure,
+			"qr_login.wait": args.qr_failure,
+			"send_code_request": args.send_code_failure,
+			"sign_in": args.sign_in_failure,
+		}
+		self.jitter = args.jitter
+		self.password_rate = args.password_rate
+		self.next_user_id = 100000
+
+	async def step(self, operation: str):
+		"""按配置等待并按失败率注入错误"""
+		delay = self.latency[operation]
+		if self.jitter:
+			delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+		if delay > 0:
+			await asyncio.sleep(delay)
+		if random.random() < self.failure[operation]:
+			raise ConnectionError(f"模拟的{operation}失败")
+
+	def new_user(self) -> "FakeUser":
+		self.next_user_id += 1
+		return FakeUser(self.next_user_id)
+
+backend: Optional[FakeBackend] = None
+
+class FakeUser:
+	def __init__(self, user_id: int):
+		self.id = user_id
+		self.bot = False
+
+class FakeSentCode:
+	def __init__(self, phone_code_hash: str):
+		self.phone_code_hash = phone_code_hash
+
+class FakeQRLogin:
+	def __init__(self, client: "FakeTelegramClient"):
+		self.client = client
+		self.url = f"tg://login?token={os.urandom(16).hex()}"
+
+	async def wait(self, timeout: Optional[float] = None):
+		await backend.step("qr_login.wait")
+		if random.random() < backend.password_rate:
+			self.client.need_password = True
+			raise SessionPasswordNeededError(None)
+		return backend.new_user()
+
+class FakeTelegramClient:
+	"""只实现API用到的TelegramClient接口"""
+
+	def __init__(self, session=None, *args, **kwargs):
+		self.session = session if isinstance(session, StringSession) else StringSession(session)
+		self._connected = False
+		self.need_password = False
+		self.disconnected: Optional[asyncio.Future] = None
+
+	async def connect(self):
+		await backend.step("connect")
+		if self.session.auth_key is None:
+			self.session.set_dc(*FAKE_DC)
+			self.session.auth_key = AuthKey(os.urandom(256))
+		self._connected = True
+		self.disconnected = asyncio.get_running_loop().create_future()
+
+	def is_connected(self) -> bool:
+		return self._connected
+
+	async def disconnect(self):
+		self._connected = False
+		if self.disconnected is not None and not self.disconnected.done():
+			self.disconnected.set_result(None)
+
+	async def qr_login(self) -> FakeQRLogin:
+		return FakeQRLogin(self)
+
+	async def send_code_request(self, phone: str):
+		await backend.step("send_code_request")
+		return FakeSentCode(os.urandom(8).hex())
+
+	async def sign_in(self, phone: Optional[str] = None, code: Optional[str] = None, password: Optional[str] = None, **kwargs):
+		await backend.step("sign_in")
+		if code is not None and random.random() < backend.password_rate:
+			self.need_password = True
+			raise SessionPasswordNeededError(None)
+		return backend.new_user()
+
+	async def get_me(self, input_peer: bool = False):
+		return backend.new_user()
+
+	async def _get_dc(self, dc_id: int):
+		class Option:
+			ip_address, port = FAKE_DC[1], FAKE_DC[2]
+		return Option()
+
+async def http_request(port: int, method: str, path: str, client_ip: str, body: Optional[Dict[str, Any]] = None, flow_token: Optional[str] = None) -> Tuple[int, Dict[str, Any]]:
+	"""最简单的HTTP/1.1客户端（每个请求一个连接），避免引入额外依赖"""
+	reader, writer = await asyncio.open_connection("127.0.0.1", port)
+	try:
+		payload = json.dumps(body).encode() if body is not None else b""
+		headers = [
+			f"{method} {path} HTTP/1.1",
+			f"Host: 127.0.0.1:{port}",
+			f"X-Real-IP: {client_ip}",
+			"Connection: close",
+			f"Content-Length: {len(payload)}",
+		]
+		if body is not None:
+			headers.append("Content-Type: application/json")
+		if flow_token:
+			headers.append(f"X-Flow-Token: {flow_token}")
+		writer.write(("\r\n".join(headers) + "\r\n\r\n").encode() + payload)
+		await writer.drain()
+		response = await reader.read()
+	finally:
+		writer.close()
+	head, _, content = response.partition(b"\r\n\r\n")
+	status = int(head.split(b" ", 2)[1])
+	try:
+		data = json.loads(content) if content else {}
+	except ValueError:
+		data = {}
+	return status, data
+
+class Recorder:
+	"""收集每个接口的请求耗时和每个流程的结果"""
+
+	def __init__(self):
+		self.requests: Dict[str, List[float]] = {}
+		self.request_errors: Dict[str, int] = {}
+		self.flows: Dict[str, List[float]] = {}
+		self.flow_failures: Dict[str, int] = {}
+
+	async def call(self, port: int, method: str, path: str, client_ip: str, body: Optional[Dict[str, Any]] = None, flow_token: Optional[str] = None) -> Tuple[int, Dict[str, Any]]:
+		name = f"{method} {path}"
+		started = time.perf_counter()
+		try:
+			status, data = await http_request(port, method, path, client_ip, body, flow_token)
+		except Exception:
+			self.request_errors[name] = self.request_errors.get(name, 0) + 1
+			raise
+		self.requests.setdefault(name, []).append(time.perf_counter() - started)
+		if status >= 400:
+			self.request_errors[name] = self.request_errors.get(name, 0) + 1
+		return status, data
+
+	def flow_done(self, scenario: str, started: float, ok: bool):
+		if ok:
+			self.flows.setdefault(scenario, []).append(time.perf_counter() - started)
+		else:
+			self.flow_failures[scenario] = self.flow_failures.get(scenario, 0) + 1
+
+async def run_qr_flow(recorder: Recorder, port: int, client_ip: str, args: argparse.Namespace) -> bool:
+	status, data = await recorder.call(port, "POST", "/get_session", client_ip, {"use_qr": True})
+	if status != 200:
+		return False
+	token = data.get("flow_token")
+	deadline = time.perf_counter() + args.flow_timeout
+	while time.perf_counter() < deadline:
+		await asyncio.sleep(args.poll_interval)
+		status, data = await recorder.call(port, "GET", "/check_qr_status", client_ip, flow_token=token)
+		if status != 200:
+			return False
+		if data.get("v2_session"):
+			return True
+		if data.get("need_password"):
+			status, data = await recorder.call(port, "POST", "/get_session", client_ip, {"use_qr": True, "password": "benchmark"}, token)
+			return status == 200 and bool(data.get("v2_session"))
+	return False
+
+async def run_phone_flow(recorder: Recorder, port: int, client_ip: str, args: argparse.Namespace) -> bool:
+	phone = "+1555" + str(random.randrange(10 ** 7)).zfill(7)
+	status, data = await recorder.call(port, "POST", "/get_session", client_ip, {"phone_number": phone})
+	if status != 200 or not data.get("need_code"):
+		return False
+	token = data.get("flow_token")
+	status, data = await recorder.call(port, "POST", "/get_session", client_ip, {"phone_number": phone, "code": "12345"}, token)
+	if status == 200 and data.get("need_password"):
+		status, data = await recorder.call(port, "POST", "/get_session", client_ip, {"phone_number": phone, "password": "benchmark"}, token)
+	return status == 200 and bool(data.get("v2_session"))
+
+async def run_convert_flow(recorder: Recorder, port: int, client_ip: str, args: argparse.Namespace) -> bool:
+	session = StringSession()
+	session.set_dc(*FAKE_DC)
+	session.auth_key = AuthKey(os.urandom(256))
+	status, data = await recorder.call(port, "POST", "/get_session", client_ip, {"v1_session": session.save(), "user_id": 1})
+	return status == 200 and bool(data.get("v2_session"))
+
+SCENARIOS = {
+	"qr": run_qr_flow,
+	"phone": run_phone_flow,
+	"convert": run_convert_flow,
+}
+
+def client_ip_for(index: int, egress_ips: int = 0) -> str:
+	"""模拟用户的IP；egress_ips大于0时所有用户共用这么多个出口IP（模拟NAT），登录流程由流程令牌区分"""
+	if egress_ips > 0:
+		index %= egress_ips
+	return f"10.{(index >> 16) & 255}.{(index >> 8) & 255}.{index & 255}"
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+	if not values:
+		return {"count": 0}
+	ordered = sorted(values)
+	def pick(q: float) -> float:
+		return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+	return {
+		"count": len(ordered),
+		"mean": statistics.fmean(ordered),
+		"p50": pick(0.50),
+		"p90": pick(0.90),
+		"p99": pick(0.99),
+		"max": ordered[-1],
+	}
+
+class LoopMonitor:
+	"""定期采样事件循环延迟、进行中的流程数和内存占用"""
+
+	def __init__(self, interval: float, trace_memory: bool):
+		self.interval = interval
+		self.trace_memory = trace_memory
+		self.lag: List[float] = []
+		self.peak_flows = 0
+		self.peak_memory = 0
+		self.baseline_memory = 0
+
+	def start(self):
+		if self.trace_memory:
+			self.baseline_memory = tracemalloc.get_traced_memory()[0]
+
+	async def run(self):
+		while True:
+			started = time.perf_counter()
+			await asyncio.sleep(self.interval)
+			self.lag.append(max(0.0, time.perf_counter() - started - self.interval))
+			flows = len(api.live_clients)
+			if flows >= self.peak_flows:
+				self.peak_flows = flows
+				if self.trace_memory:
+					self.peak_memory = max(self.peak_memory, tracemalloc.get_traced_memory()[0])
+
+	def report(self) -> Dict[str, Any]:
+		result: Dict[str, Any] = {
+			"event_loop_lag": percentiles(self.lag),
+			"peak_active_flows": self.peak_flows,
+		}
+		if self.trace_memory and self.peak_flows:
+			result["memory_per_active_flow_bytes"] = int((self.peak_memory - self.baseline_memory) / self.peak_flows)
+		return result
+
+def free_port() -> int:
+	with socket.socket() as sock:
+		sock.bind(("127.0.0.1", 0))
+		return sock.getsockname()[1]
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+	global backend
+	backend = FakeBackend(args)
+	api.TelegramClient = FakeTelegramClient
+	api.setup_logging()
+	api.logger.setLevel(getattr(logging, args.log_level))
+
+	port = free_port()
+	server = uvicorn.Server(uvicorn.Config(
+		api.create_app(),
+		host="127.0.0.1",
+		port=port,
+		log_level="warning",
+		access_log=False,
+		backlog=max(2048, args.concurrency * 2),
+	))
+	server_task = asyncio.create_task(server.serve())
+	while not server.started:
+		await asyncio.sleep(0.01)
+
+	scenarios = list(SCENARIOS) if args.scenario == "mixed" else [args.scenario]
+	recorder = Recorder()
+	monitor = LoopMonitor(args.lag_interval, not args.no_memory)
+	monitor_task = asyncio.create_task(monitor.run())
+	semaphore = asyncio.Semaphore(args.concurrency)
+	monitor.start()
+
+	async def one_flow(index: int):
+		scenario = scenarios[index % len(scenarios)]
+		async with semaphore:
+			started = time.perf_counter()
+			try:
+				ok = await SCENARIOS[scenario](recorder, port, client_ip_for(index, args.egress_ips), args)
+			except Exception:
+				ok = False
+			recorder.flow_done(scenario, started, ok)
+
+	started = time.perf_counter()
+	await asyncio.gather(*(one_flow(index) for index in range(args.flows)))
+	elapsed = time.perf_counter() - started
+
+	monitor_task.cancel()
+	server.should_exit = True
+	await server_task
+
+	completed = sum(len(durations) for durations in recorder.flows.values())
+	total_requests = sum(len(durations) for durations in recorder.requests.values())
+	return {
+		"config": {key: value for key, value in vars(args).items() if key != "output"},
+		"elapsed_seconds": elapsed,
+		"throughput": {
+			"flows_per_second": completed / elapsed if elapsed else 0.0,
+			"requests_per_second": total_requests / elapsed if elapsed else 0.0,
+		},
+		"flows": {
+			scenario: {**percentiles(recorder.flows.get(scenario, [])), "failures": recorder.flow_failures.get(scenario, 0)}
+			for scenario in scenarios
+		},
+		"requests": {
+			name: {**percentiles(durations), "errors": recorder.request_errors.get(name, 0)}
+			for name, durations in sorted(recorder.requests.items())
+		},
+		**monitor.report(),
+	}
+
+IMPORT_TIME_SCRIPT = "import time; started = time.perf_counter(); import api; print(time.perf_counter() - started)"
+
+def measure_import_time(runs: int) -> Dict[str, Any]:
+	"""在全新的Python进程中导入api模块，统计导入耗时（不含解释器本身的启动时间）"""
+	durations = []
+	for _ in range(runs):
+		output = subprocess.run(
+			[sys.executable, "-c", IMPORT_TIME_SCRIPT],
+			cwd=os.path.dirname(os.path.abspath(__file__)),
+			capture_output=True,
+			text=True,
+			check=True,
+		).stdout
+		durations.append(float(output.strip().splitlines()[-1]))
+	return {"import_seconds": percentiles(durations)}
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+	parser = argparse.ArgumentParser(description="使用模拟的Telegram后端压测 TG Session API")
+	parser.add_argument("--flows", type=int, default=1000, help="模拟的登录流程总数")
+	parser.add_argument("--concurrency", type=int, default=1000, help="同时进行的流程数")
+	parser.add_argument("--scenario", choices=[*SCENARIOS, "mixed"], default="qr", help="压测场景，mixed 为三种流程轮流")
+	parser.add_argument("--poll-interval", type=float, default=1.0, help="QR流程中 /check_qr_status 的轮询间隔（秒）")
+	parser.add_argument("--flow-timeout", type=float, default=120.0, help="单个流程的最长等待时间（秒）")
+	parser.add_argument("--connect-latency", type=float, default=0.05, help="模拟 connect() 耗时（秒）")
+	parser.add_argument("--qr-wait", type=float, default=3.0, help="模拟从生成二维码到扫码完成的耗时（秒）")
+	parser.add_argument("--send-code-latency", type=float, default=0.1, help="模拟 send_code_request 耗时（秒）")
+	parser.add_argument("--sign-in-latency", type=float, default=0.1, help="模拟 sign_in 耗时（秒）")
+	parser.add_argument("--jitter", type=float, default=0.2, help="延迟的随机抖动比例")
+	parser.add_argument("--connect-failure", type=float, default=0.0, help="connect() 失败率")
+	parser.add_argument("--qr-failure", type=float, default=0.0, help="qr_login().wait 失败率")
+	parser.add_argument("--send-code-failure", type=float, default=0.0, help="send_code_request 失败率")
+	parser.add_argument("--sign-in-failure", type=float, default=0.0, help="sign_in 失败率")
+	parser.add_argument("--egress-ips", type=int, default=0, help="模拟用户共用的出口IP数（模拟NAT），0 表示每个用户一个IP")
+	parser.add_argument("--password-rate", type=float, default=0.0, help="需要两步验证密码的账号比例")
+	parser.add_argument("--lag-interval", type=float, default=0.05, help="事件循环延迟的采样间隔（秒）")
+	parser.add_argument("--no-memory", action="store_true", help="不统计内存（tracemalloc 会明显拖慢运行）")
+	parser.add_argument("--log-level", default="WARNING", choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="API日志级别")
+	parser.add_argument("--seed", type=int, default=None, help="随机种子，便于复现")
+	parser.add_argument("--import-time", type=int, default=0, metavar="N", help="只测量导入api模块的耗时，重复N次")
+	parser.add_argument("--output", default=None, help="结果输出文件，默认输出到标准输出")
+	return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None):
+	args = parse_args(argv)
+	if args.seed is not None:
+		random.seed(args.seed)
+	if args.import_time > 0:
+		result = measure_import_time(args.import_time)
+	else:
+		if not args.no_memory:
+			tracemalloc.start()
+		result = asyncio.run(run_benchmark(args))
+	output = json.dumps(result, ensure_ascii=False, indent=2)
+	if args.output:
+		with open(args.output, "w", encoding="utf-8") as f:
+			f.write(output + "\n")
+	else:
+		print(output)
+
+if __name__ == "__main__":
+	main(sys.argv[1:])
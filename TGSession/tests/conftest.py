@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 测试直接导入 TGSession/api.py（与 uvicorn 在 TGSession 目录下以 api:create_app 启动时相同）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
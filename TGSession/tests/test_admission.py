@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import api
+
+
+@pytest.fixture
+def limits(monkeypatch):
+	monkeypatch.setattr(api, "max_live_clients", 2)
+	monkeypatch.setattr(api, "max_inflight_connects", 8)
+	monkeypatch.setattr(api, "rate_limit_ip_rate", 0)
+	monkeypatch.setattr(api, "rate_limit_global_rate", 0)
+	monkeypatch.setattr(api, "live_clients", {})
+
+
+def run_concurrently(enter, count):
+	"""同时进入count个准入区块，返回成功进入的数量和被拒绝的状态码"""
+
+	async def one():
+		try:
+			async with enter():
+				await asyncio.sleep(0.05)
+			return None
+		except HTTPException as e:
+			return e.status_code
+
+	async def run():
+		return await asyncio.gather(*(one() for _ in range(count)))
+
+	results = asyncio.run(run())
+	return results.count(None), [code for code in results if code is not None]
+
+
+def test_concurrent_admits_respect_live_client_cap(limits):
+	admission = api.AdmissionController()
+	admitted, rejected = run_concurrently(lambda: admission.admit("1.2.3.4"), 5)
+	assert admitted == 2
+	assert rejected == [503, 503, 503]
+	assert admission.reserved == 0
+
+
+def test_transient_connects_count_against_cap(limits):
+	admission = api.AdmissionController()
+
+	async def run():
+		async with admission.transient():
+			async with admission.transient():
+				with pytest.raises(HTTPException) as e:
+					async with admission.admit("1.2.3.4"):
+						pass
+				return e.value.status_code
+
+	assert asyncio.run(run()) == 503
+
+
+def test_verified_batch_larger_than_connect_limit(limits, monkeypatch):
+	monkeypatch.setattr(api, "max_live_clients", 0)
+	monkeypatch.setattr(api, "max_inflight_connects", 2)
+	monkeypatch.setattr(api, "admission_queue_timeout", 0.01)
+	monkeypatch.setattr(api, "admission", api.AdmissionController())
+	monkeypatch.setattr(api, "convert_cache", api.ConversionCache(0, 600))
+	connecting = {"now": 0, "max": 0}
+
+	class VerifyClient:
+		async def get_me(self):
+			await asyncio.sleep(0.05)
+			return type("User", (), {"id": 42})()
+
+		async def disconnect(self):
+			connecting["now"] -= 1
+
+	async def fake_connect_client(session=None, dc_address=None):
+		connecting["now"] += 1
+		connecting["max"] = max(connecting["max"], connecting["now"])
+		return VerifyClient()
+
+	monkeypatch.setattr(api, "connect_client", fake_connect_client)
+	sessions = [
+		api.build_v1_session({"dc_id": 2, "server_address": "149.154.167.51", "port": 443, "auth_key": bytes([i + 1]) * 256})
+		for i in range(10)
+	]
+
+	response = TestClient(api.app).post("/convert_batch", json={"sessions": sessions, "verify": True, "concurrency": 10})
+
+	results = [json.loads(line) for line in response.text.splitlines()]
+	assert len(results) == 10
+	assert all(result["success"] for result in results), results
+	assert connecting["max"] <= 2
+
+
+def test_rejected_qr_restart_keeps_existing_flow(limits, monkeypatch):
+	monkeypatch.setattr(api, "max_live_clients", 1)
+	monkeypatch.setattr(api, "login_states", api.MemoryFlowStore())
+	monkeypatch.setattr(api, "flow_checkpoints", None)
+
+	class ExistingClient:
+		disconnected = False
+
+		async def disconnect(self):
+			self.disconnected = True
+
+	state = api.FlowState.new("qr", qr_url="tg://login?token=old", qr_base64="b2xk")
+	existing = ExistingClient()
+	api.login_states.set("key1", state)
+	api.live_clients["key1"] = api.LiveClient(state.flow_id, existing)
+
+	with pytest.raises(HTTPException) as e:
+		asyncio.run(api.login_flow("key1", "1.2.3.4", api.SessionRequest(use_qr=True)))
+
+	assert e.value.status_code == 503
+	assert api.get_live_client("key1", state).client is existing
+	assert not existing.disconnected
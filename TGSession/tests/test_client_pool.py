@@ -0,0 +1,70 @@
+import asyncio
+
+import api
+
+
+class FakeClient:
+	def __init__(self, dc_id):
+		self.dc_id = dc_id
+		self.connected = True
+
+	def is_connected(self):
+		return self.connected
+
+	async def disconnect(self):
+		self.connected = False
+
+
+def make_pool(monkeypatch, dc_ids):
+	connected = []
+
+	async def fake_connect_client(session=None, dc_address=None):
+		client = FakeClient(dc_address[0] if dc_address else None)
+		connected.append(client)
+		return client
+
+	monkeypatch.setattr(api, "connect_client", fake_connect_client)
+	pool = api.ClientPool(2, 600, dc_ids)
+	pool._dc_addresses = {dc_id: ("127.0.0.1", 443) for dc_id in dc_ids or ()}
+	return pool, connected
+
+
+def test_default_pool_serves_unspecified_dc(monkeypatch):
+	pool, _ = make_pool(monkeypatch, None)
+
+	async def run():
+		await pool._refill()
+		return [await pool.acquire() for _ in range(2)]
+
+	clients = asyncio.run(run())
+	assert [client.dc_id for client in clients] == [None, None]
+	assert (pool.hits, pool.misses) == (2, 0)
+
+
+def test_configured_dcs_serve_unspecified_dc(monkeypatch):
+	# CLIENT_POOL_DCS=2,4：QR登录和发送验证码不指定DC，应使用第一个DC的预连接客户端
+	pool, connected = make_pool(monkeypatch, [2, 4])
+
+	async def run():
+		await pool._refill()
+		return [await pool.acquire() for _ in range(2)], await pool.acquire(4)
+
+	clients, dc4_client = asyncio.run(run())
+	assert [client.dc_id for client in clients] == [2, 2]
+	assert dc4_client.dc_id == 4
+	assert (pool.hits, pool.misses) == (3, 0)
+	assert len(connected) == 4
+
+
+def test_stale_clients_are_replaced(monkeypatch):
+	pool, _ = make_pool(monkeypatch, [2])
+
+	async def run():
+		await pool._refill()
+		for _, client in pool._idle[2]:
+			client.connected = False
+		return await pool.acquire()
+
+	client = asyncio.run(run())
+	assert client.is_connected()
+	assert (pool.hits, pool.misses) == (0, 1)
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+import api
+
+
+class HangingClient:
+	def __init__(self):
+		self.disconnected = False
+
+	async def connect(self):
+		await asyncio.sleep(60)
+
+	async def disconnect(self):
+		self.disconnected = True
+
+
+def setup_proxy(monkeypatch):
+	pool = api.ProxyPool([("socks5", "127.0.0.1", 1080)])
+	clients = []
+
+	def fake_create_client(session, upstream):
+		clients.append(HangingClient())
+		return clients[-1]
+
+	monkeypatch.setattr(api, "proxy_pool", pool)
+	monkeypatch.setattr(api, "create_client", fake_create_client)
+	return pool.upstreams[0], clients
+
+
+def test_cancelled_connect_releases_upstream_and_disconnects(monkeypatch):
+	upstream, clients = setup_proxy(monkeypatch)
+
+	async def run():
+		task = asyncio.create_task(api.connect_client())
+		await asyncio.sleep(0.01)
+		assert upstream.active == 1
+		task.cancel()
+		await asyncio.gather(task, return_exceptions=True)
+		return task
+
+	assert asyncio.run(run()).cancelled()
+	assert upstream.active == 0
+	assert upstream.failures == 0
+	assert clients[0].disconnected
+
+
+def test_connect_past_deadline_releases_upstream_and_disconnects(monkeypatch):
+	upstream, clients = setup_proxy(monkeypatch)
+
+	async def run():
+		with api.request_deadline(0.01):
+			await api.connect_client()
+
+	with pytest.raises(api.RequestTimeout):
+		asyncio.run(run())
+	assert upstream.active == 0
+	assert upstream.failures == 1
+	assert clients[0].disconnected
@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+import api
+
+
+class FakeSession:
+	def save(self):
+		return "1restored"
+
+
+class FakeClient:
+	def __init__(self):
+		self.session = FakeSession()
+
+	async def disconnect(self):
+		pass
+
+
+def setup_restart(monkeypatch, tmp_path, worker_index, worker_id):
+	"""模拟进程重启：共享状态和检查点还在，本进程没有任何连接"""
+	path = str(tmp_path / "state.db")
+	monkeypatch.setattr(api, "_state_cipher", api.CheckpointCipher(b"test-secret"))
+	monkeypatch.setattr(api, "login_states", api.SQLiteFlowStore(path))
+	monkeypatch.setattr(api, "flow_checkpoints", api.FlowCheckpointStore(path))
+	monkeypatch.setattr(api, "live_clients", {})
+	monkeypatch.setattr(api, "schedule_flow_expiry", lambda client_id, state: None)
+
+	async def fake_connect_client(session=None, dc_address=None):
+		assert session == "1checkpointed"
+		return FakeClient()
+
+	monkeypatch.setattr(api, "connect_client", fake_connect_client)
+
+	state = api.FlowState(
+		"flow1", "pid1", "phone", api.FlowStage.AWAITING_CODE, time.time(),
+		phone_number="+10000000000", phone_code_hash="hash"
+	)
+	api.login_states.set("key1", state)
+	api.flow_checkpoints.save("key1", state, "1checkpointed")
+	monkeypatch.setattr(api, "_worker_index", worker_index)
+	monkeypatch.setattr(api, "worker_id", worker_id)
+
+
+def test_single_process_restart_restores_flow(monkeypatch, tmp_path):
+	setup_restart(monkeypatch, tmp_path, None, "pid2")
+
+	state = asyncio.run(api.load_flow_state("key1"))
+
+	assert state is not None and state.flow_id == "flow1"
+	assert state.owner == "pid2"
+	assert api.get_live_client("key1", state) is not None
+	assert api.login_states.get("key1").owner == "pid2"
+	assert api.flow_checkpoints.load("key1")[0]["owner"] == "pid2"
+
+
+def test_fixed_worker_index_leaves_other_workers_flow(monkeypatch, tmp_path):
+	setup_restart(monkeypatch, tmp_path, "1", "w1")
+
+	state = asyncio.run(api.load_flow_state("key1"))
+
+	assert state.owner == "pid1"
+	assert api.get_live_client("key1", state) is None
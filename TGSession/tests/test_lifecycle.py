@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+import api
+
+
+def test_drain_waits_for_steps():
+	lifecycle = api.DrainController()
+
+	async def run():
+		async def step():
+			with lifecycle.step():
+				await asyncio.sleep(0.1)
+
+		task = asyncio.create_task(step())
+		await asyncio.sleep(0)
+		unfinished = await lifecycle.drain(5)
+		await task
+		return unfinished
+
+	assert asyncio.run(run()) == 0
+	assert lifecycle.draining
+
+
+def test_repeated_drain_shares_one_deadline():
+	# 收到停止信号时和应用关闭时各排空一次，总等待时间不能超过一个 timeout
+	lifecycle = api.DrainController()
+
+	async def run():
+		async def stuck():
+			with lifecycle.step():
+				await asyncio.sleep(10)
+
+		task = asyncio.create_task(stuck())
+		await asyncio.sleep(0)
+		started = time.monotonic()
+		first = await lifecycle.drain(0.3)
+		second = await lifecycle.drain(0.3)
+		elapsed = time.monotonic() - started
+		task.cancel()
+		return first, second, elapsed
+
+	first, second, elapsed = asyncio.run(run())
+	assert (first, second) == (1, 1)
+	assert elapsed < 0.5
+
+
+def test_resume_accepts_new_flows_again():
+	lifecycle = api.DrainController()
+	asyncio.run(lifecycle.drain(0))
+	lifecycle.resume()
+	assert not lifecycle.draining and lifecycle.deadline is None
@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+import api
+
+
+def test_expired_deadline_raises_request_timeout():
+	async def run():
+		with api.request_deadline(0.01):
+			async with api.within_deadline("connect"):
+				await asyncio.sleep(1)
+
+	with pytest.raises(api.RequestTimeout) as exc_info:
+		asyncio.run(run())
+	assert exc_info.value.operation == "connect"
+
+
+def test_inner_timeout_is_not_a_request_timeout():
+	async def run():
+		with api.request_deadline(10):
+			async with api.within_deadline("sign_in"):
+				await asyncio.wait_for(asyncio.sleep(1), 0.01)
+
+	with pytest.raises(TimeoutError) as exc_info:
+		asyncio.run(run())
+	assert not isinstance(exc_info.value, api.RequestTimeout)
+
+
+def test_no_deadline_does_not_limit():
+	async def run():
+		async with api.within_deadline("qr_login"):
+			await asyncio.sleep(0.01)
+		return True
+
+	assert asyncio.run(run())
@@ -0,0 +1,98 @@
+import base64
+import json
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+
+AUTH_KEY = os.urandom(256)
+
+
+def make_session_data(server_address, dc_id=2, port=443):
+	return {"dc_id": dc_id, "server_address": server_address, "port": port, "auth_key": AUTH_KEY}
+
+
+@pytest.mark.parametrize("server_address", ["149.154.167.51", "2001:67c:4e8:f002::a"])
+def test_v1_round_trip(server_address):
+	session_data = make_session_data(server_address)
+	assert api.decode_v1_session(api.build_v1_session(session_data)) == session_data
+
+
+@pytest.mark.parametrize("server_address", ["149.154.167.51", "2001:67c:4e8:f002::a"])
+@pytest.mark.parametrize("user_id", [None, 123456789])
+def test_v2_round_trip(server_address, user_id):
+	session_data = make_session_data(server_address)
+	assert api.decode_v2_session(api.build_v2_session(session_data, user_id)) == (session_data, user_id)
+
+
+@pytest.mark.parametrize("server_address", ["149.154.167.51", "2001:67c:4e8:f002::a"])
+def test_build_v1_matches_telethon(server_address):
+	telethon = pytest.importorskip("telethon")
+	from telethon.crypto import AuthKey
+	from telethon.sessions import StringSession
+
+	session = StringSession()
+	session.set_dc(4, server_address, 443)
+	session.auth_key = AuthKey(AUTH_KEY)
+	assert telethon.__version__.startswith("1.")
+	assert api.build_v1_session(make_session_data(server_address, dc_id=4)) == session.save()
+
+
+def test_build_v2_matches_jsonpickle_output():
+	# Telethon 2.x 用 jsonpickle（json.dumps 默认分隔符，按字段定义顺序）输出 V2 session
+	expected = {
+		"py/object": "telethon._impl.session.session.Session",
+		"dcs": [{
+			"py/object": "telethon._impl.session.session.DataCenter",
+			"id": 2,
+			"ipv4_addr": "149.154.167.51:443",
+			"ipv6_addr": None,
+			"auth": {"py/b64": base64.b64encode(AUTH_KEY).decode("ascii")},
+		}],
+		"user": {
+			"py/object": "telethon._impl.session.session.User",
+			"id": 42,
+			"dc": 2,
+			"bot": False,
+			"username": None,
+		},
+		"state": {},
+	}
+	v2_session = api.build_v2_session(make_session_data("149.154.167.51"), 42)
+	assert base64.b64decode(v2_session).decode("utf-8") == json.dumps(expected)
+
+
+@pytest.mark.parametrize("v1_session", [
+	"",
+	"2" + "A" * 352,
+	"1" + "A" * 352,
+	"1not-base64!",
+	"1" + base64.urlsafe_b64encode(b"\x02" * 100).decode(),
+	"1中文",
+])
+def test_decode_v1_rejects_malformed(v1_session):
+	with pytest.raises(ValueError):
+		api.decode_v1_session(v1_session)
+
+
+@pytest.mark.parametrize("v2_session", [
+	"",
+	"not base64",
+	base64.b64encode(b"\xff\xfe").decode(),
+	base64.b64encode(b"[]").decode(),
+	base64.b64encode(b'{"dcs": []}').decode(),
+	base64.b64encode(json.dumps({"dcs": [{"id": 2, "ipv4_addr": "bad:443", "auth": {"py/b64": "AA=="}}]}).encode()).decode(),
+	base64.b64encode(json.dumps({"dcs": [{"id": 2, "ipv4_addr": "149.154.167.51:443", "auth": {"py/b64": "AA=="}}]}).encode()).decode(),
+])
+def test_decode_v2_rejects_malformed(v2_session):
+	with pytest.raises(ValueError):
+		api.decode_v2_session(v2_session)
+
+
+@pytest.mark.parametrize("payload", [{"v1_session": "1broken"}, {"v2_session": "broken"}])
+def test_get_session_returns_400_for_malformed_session(payload):
+	response = TestClient(api.app).post("/get_session", json=payload)
+	assert response.status_code == 400
+	assert response.json()["detail"].startswith("转换失败")
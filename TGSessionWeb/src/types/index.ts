@@ -40,6 +40,8 @@ export interface Verify2FARequest {
 export interface QRLoginResponse extends ApiResponse {
   qr_code_base64?: string;
   qr_code_url?: string;
+  qr_image_url?: string;
+  flow_token?: string;
   login_token?: string;
   status?: 'waiting' | 'scanned' | 'confirmed' | 'expired';
   v1_session?: string;
@@ -55,6 +57,8 @@ export interface CheckQRLoginRequest {
 // V1到V2转换相关类型
 export interface ConvertV1ToV2Request {
   v1_session: string;
+  user_id?: number; // 可选，写入 V2 会话的用户ID
+  verify?: boolean; // 是否联网校验 V1 会话并获取用户ID
 }
 
 export interface ConvertV1ToV2Response extends ApiResponse {
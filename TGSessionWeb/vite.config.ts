@@ -1,10 +1,47 @@
-import { defineConfig } from 'vite'
+import { defineConfig, type Plugin } from 'vite'
 import vue from '@vitejs/plugin-vue'
-import { resolve } from 'path'
+import { join, resolve } from 'path'
+import { readdirSync, readFileSync, statSync, writeFileSync } from 'fs'
+import { brotliCompressSync, constants, gzipSync } from 'zlib'
+
+// 构建完成后为文本资源生成 .gz 和 .br 预压缩文件，nginx 通过 gzip_static / brotli_static 直接发送，
+// 不再在每次请求时压缩；压缩后没有变小或小于 minSize 字节的文件跳过
+const COMPRESSIBLE = /\.(js|mjs|css|html|svg|json|txt|xml|wasm)$/
+const precompress = (minSize = 1024): Plugin => {
+  let outDir = 'dist'
+  const files = (dir: string): string[] =>
+    readdirSync(dir).flatMap((name) => {
+      const path = join(dir, name)
+      return statSync(path).isDirectory() ? files(path) : [path]
+    })
+  return {
+    name: 'precompress',
+    apply: 'build',
+    configResolved(config) {
+      outDir = resolve(config.root, config.build.outDir)
+    },
+    closeBundle() {
+      for (const file of files(outDir)) {
+        if (!COMPRESSIBLE.test(file)) continue
+        const data = readFileSync(file)
+        if (data.length < minSize) continue
+        const gzip = gzipSync(data, { level: 9 })
+        if (gzip.length < data.length) writeFileSync(`${file}.gz`, gzip)
+        const brotli = brotliCompressSync(data, {
+          params: {
+            [constants.BROTLI_PARAM_QUALITY]: constants.BROTLI_MAX_QUALITY,
+            [constants.BROTLI_PARAM_SIZE_HINT]: data.length
+          }
+        })
+        if (brotli.length < data.length) writeFileSync(`${file}.br`, brotli)
+      }
+    }
+  }
+}
 
 // https://vitejs.dev/config/
 export default defineConfig({
-  plugins: [vue()],
+  plugins: [vue(), precompress()],
   resolve: {
     alias: {
       '@': resolve(__dirname, 'src')
@@ -18,11 +55,31 @@ export default defineConfig({
         changeOrigin: true,
         secure: false
       },
+      '/convert_batch': {
+        target: 'http://localhost:8000',
+        changeOrigin: true,
+        secure: false
+      },
       '/check_qr_status': {
         target: 'http://localhost:8000',
         changeOrigin: true,
         secure: false
       },
+      '/cancel_flow': {
+        target: 'http://localhost:8000',
+        changeOrigin: true,
+        secure: false
+      },
+      '/qr_image': {
+        target: 'http://localhost:8000',
+        changeOrigin: true,
+        secure: false
+      },
+      '/qr_status_stream': {
+        target: 'http://localhost:8000',
+        changeOrigin: true,
+        secure: false
+      },
       '/active_sessions': {
         target: 'http://localhost:8000',
         changeOrigin: true,
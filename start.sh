@@ -8,11 +8,12 @@ export BACKEND_HOST=${BACKEND_HOST:-127.0.0.1}
 export BACKEND_PORT=${BACKEND_PORT:-8000}
 export WORKERS=${WORKERS:-1}
 
-# 当前登录流程状态保存在进程内存中，多 worker 会导致多步请求落到不同进程后丢失状态。
-if [ "${WORKERS}" != "1" ]; then
-    echo "WORKERS=${WORKERS} is not supported with in-memory login state, forcing WORKERS=1"
-    WORKERS=1
-fi
+case "${WORKERS}" in
+    ''|*[!0-9]*|0)
+        echo "Invalid WORKERS=${WORKERS}, falling back to WORKERS=1"
+        WORKERS=1
+        ;;
+esac
 
 echo "Starting TGSession integrated service..."
 echo "- Domain: ${DOMAIN}"
@@ -31,13 +32,52 @@ else
     echo "No SSL certs found - serving HTTP only"
 fi
 
+# 前端构建时生成了 .br/.gz 预压缩文件；安装了 brotli_static 模块时优先发送 .br
+BROTLI_AVAILABLE=false
+if ls /etc/nginx/modules-enabled/*brotli* >/dev/null 2>&1; then
+    BROTLI_AVAILABLE=true
+fi
+
 # Remove default nginx site if present
 if [ -f /etc/nginx/sites-enabled/default ]; then
     rm -f /etc/nginx/sites-enabled/default
 fi
 
+# 每个 worker 是一个独立的 uvicorn 进程，端口依次为 BACKEND_PORT、BACKEND_PORT+1……
+# 登录流程中的 TelegramClient 只存在于创建它的进程内，nginx 根据流程令牌（cookie tg_flow 或 X-Flow-Token 请求头）
+# 的 w<序号> 前缀把同一流程的后续请求路由回该进程；没有令牌的请求按客户端IP一致性哈希分配，由处理它的进程签发新令牌
+generate_upstreams() {
+    echo "upstream tgsession_pool {"
+    echo "    hash \$remote_addr consistent;"
+    i=0
+    while [ "$i" -lt "${WORKERS}" ]; do
+        echo "    server ${BACKEND_HOST}:$((BACKEND_PORT + i));"
+        i=$((i + 1))
+    done
+    echo "}"
+    i=0
+    while [ "$i" -lt "${WORKERS}" ]; do
+        echo ""
+        echo "upstream tgsession_w${i} {"
+        echo "    server ${BACKEND_HOST}:$((BACKEND_PORT + i));"
+        echo "}"
+        i=$((i + 1))
+    done
+    echo ""
+    echo "map \"\$http_x_flow_token\$cookie_tg_flow\" \$tgsession_upstream {"
+    echo "    default tgsession_pool;"
+    i=0
+    while [ "$i" -lt "${WORKERS}" ]; do
+        echo "    ~^w${i}\\. tgsession_w${i};"
+        i=$((i + 1))
+    done
+    echo "}"
+}
+
 # Generate nginx config
 cat > /etc/nginx/conf.d/default.conf << EOF
+$(generate_upstreams)
+
 # HTTP server
 server {
     listen 80;
@@ -84,7 +124,7 @@ fi)
 
     # API endpoints
     location = /get_session {
-        proxy_pass http://${BACKEND_HOST}:${BACKEND_PORT}/get_session;
+        proxy_pass http://\$tgsession_upstream/get_session;
         proxy_set_header Host \$host;
         proxy_set_header X-Real-IP \$remote_addr;
         proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
@@ -95,8 +135,21 @@ fi)
         proxy_buffering off;
     }
 
+    location = /convert_batch {
+        proxy_pass http://\$tgsession_upstream/convert_batch\$is_args\$args;
+        proxy_set_header Host \$host;
+        proxy_set_header X-Real-IP \$remote_addr;
+        proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto \$scheme;
+        proxy_connect_timeout 15s;
+        proxy_send_timeout 60s;
+        proxy_read_timeout 600s;
+        proxy_buffering off;
+        proxy_request_buffering off;
+    }
+
     location = /check_qr_status {
-        proxy_pass http://${BACKEND_HOST}:${BACKEND_PORT}/check_qr_status;
+        proxy_pass http://\$tgsession_upstream/check_qr_status;
         proxy_set_header Host \$host;
         proxy_set_header X-Real-IP \$remote_addr;
         proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
@@ -107,8 +160,44 @@ fi)
         proxy_buffering off;
     }
 
+    # 二维码图片（带ETag，未变化时返回304）
+    location = /qr_image {
+        proxy_pass http://\$tgsession_upstream/qr_image\$is_args\$args;
+        proxy_set_header Host \$host;
+        proxy_set_header X-Real-IP \$remote_addr;
+        proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto \$scheme;
+        proxy_connect_timeout 10s;
+        proxy_send_timeout 10s;
+        proxy_read_timeout 30s;
+    }
+
+    location = /qr_status_stream {
+        proxy_pass http://\$tgsession_upstream/qr_status_stream;
+        proxy_http_version 1.1;
+        proxy_set_header Connection "";
+        proxy_set_header Host \$host;
+        proxy_set_header X-Real-IP \$remote_addr;
+        proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto \$scheme;
+        proxy_connect_timeout 10s;
+        proxy_send_timeout 10s;
+        proxy_read_timeout 300s;
+        proxy_buffering off;
+        proxy_cache off;
+    }
+
+    # 结束当前流程令牌对应的登录流程（按令牌路由回持有连接的worker）
+    location = /cancel_flow {
+        proxy_pass http://\$tgsession_upstream/cancel_flow;
+        proxy_set_header Host \$host;
+        proxy_set_header X-Real-IP \$remote_addr;
+        proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto \$scheme;
+    }
+
     location = /active_sessions {
-        proxy_pass http://${BACKEND_HOST}:${BACKEND_PORT}/active_sessions;
+        proxy_pass http://\$tgsession_upstream/active_sessions;
         proxy_set_header Host \$host;
         proxy_set_header X-Real-IP \$remote_addr;
         proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
@@ -116,22 +205,39 @@ fi)
     }
 
     location = /cleanup_all {
-        proxy_pass http://${BACKEND_HOST}:${BACKEND_PORT}/cleanup_all;
+        proxy_pass http://\$tgsession_upstream/cleanup_all;
         proxy_set_header Host \$host;
         proxy_set_header X-Real-IP \$remote_addr;
         proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
         proxy_set_header X-Forwarded-Proto \$scheme;
     }
 
-    location ~ ^/cleanup/(.+)$ {
-        proxy_pass http://${BACKEND_HOST}:${BACKEND_PORT}/cleanup/\$1;
+    # 使用命名捕获，避免 map 中的正则覆盖 \$1
+    location ~ ^/cleanup/(?<cleanup_id>.+)$ {
+        proxy_pass http://\$tgsession_upstream/cleanup/\$cleanup_id;
         proxy_set_header Host \$host;
         proxy_set_header X-Real-IP \$remote_addr;
         proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
         proxy_set_header X-Forwarded-Proto \$scheme;
     }
 
-    # Static assets
+    # 静态文件直接发送构建时生成的预压缩文件（.br/.gz），客户端不支持压缩时发送原文件
+$(if [ "$BROTLI_AVAILABLE" = true ]; then
+    echo "    brotli_static on;"
+fi)
+    gzip_static on;
+    gzip_vary on;
+
+    # 带内容哈希的构建产物（Vite 输出到 assets/，内容变化时文件名随之变化），长期缓存且不再重新验证
+    location ^~ /assets/ {
+        root /app/frontend/dist;
+        try_files \$uri =404;
+        access_log off;
+        add_header Cache-Control "public, max-age=31536000, immutable";
+        add_header X-Content-Type-Options nosniff;
+    }
+
+    # Static assets（文件名不带哈希）
     location ~* \.(js|css|png|jpg|jpeg|gif|ico|svg|woff|woff2|ttf|eot)$ {
         root /app/frontend/dist;
         expires 30d;
@@ -140,14 +246,13 @@ fi)
     }
 
     # SPA routing
+    # index.html 引用当前版本的哈希文件名，每次使用前向服务器验证（未变化时返回304），发布新版本后立即生效
     location / {
         root /app/frontend/dist;
         index index.html;
         try_files \$uri \$uri/ /index.html;
         location ~* \.html$ {
-            add_header Cache-Control "no-cache, no-store, must-revalidate";
-            add_header Pragma "no-cache";
-            add_header Expires "0";
+            add_header Cache-Control "no-cache";
         }
     }
 }
@@ -155,27 +260,67 @@ EOF
 
 echo "Nginx config generated."
 
-# Start backend (uvicorn) in background
+# Start backend workers (one uvicorn process per worker) in background
 echo "Starting FastAPI backend..."
-python -m uvicorn TGSession.api:app --host ${BACKEND_HOST} --port ${BACKEND_PORT} --workers ${WORKERS} > /app/logs/backend.log 2>&1 &
+: > /app/logs/backend.log
+# 停止时（SIGTERM）worker 先拒绝新的登录流程、等待进行中的登录步骤完成（SHUTDOWN_DRAIN_TIMEOUT），
+# 再由 uvicorn 等待未完成的请求（UVICORN_GRACEFUL_TIMEOUT），最后并发断开全部连接（SHUTDOWN_DISCONNECT_TIMEOUT）
+export SHUTDOWN_DRAIN_TIMEOUT=${SHUTDOWN_DRAIN_TIMEOUT:-10}
+export SHUTDOWN_DISCONNECT_TIMEOUT=${SHUTDOWN_DISCONNECT_TIMEOUT:-5}
+UVICORN_GRACEFUL_TIMEOUT=${UVICORN_GRACEFUL_TIMEOUT:-5}
+WORKER_PIDS=""
+i=0
+while [ "$i" -lt "${WORKERS}" ]; do
+    WORKER_INDEX=$i python -m uvicorn --factory TGSession.api:create_app --host ${BACKEND_HOST} --port $((BACKEND_PORT + i)) \
+        --timeout-graceful-shutdown ${UVICORN_GRACEFUL_TIMEOUT} >> /app/logs/backend.log 2>&1 &
+    WORKER_PIDS="${WORKER_PIDS} $!"
+    i=$((i + 1))
+done
+
+backend_healthy() {
+    i=0
+    while [ "$i" -lt "${WORKERS}" ]; do
+        curl -fsS http://${BACKEND_HOST}:$((BACKEND_PORT + i))/health >/dev/null 2>&1 || return 1
+        i=$((i + 1))
+    done
+    return 0
+}
 
 # Wait for backend health
 echo "Waiting for backend to become healthy..."
-for i in $(seq 1 40); do
-    if curl -fsS http://${BACKEND_HOST}:${BACKEND_PORT}/health >/dev/null 2>&1; then
+for n in $(seq 1 40); do
+    if backend_healthy; then
         echo "Backend is healthy."
         break
     fi
-    echo "... ($i/40)"
+    echo "... ($n/40)"
     sleep 1
 done
 
-if ! curl -fsS http://${BACKEND_HOST}:${BACKEND_PORT}/health >/dev/null 2>&1; then
+if ! backend_healthy; then
     echo "ERROR: Backend failed to start. Logs:" >&2
     tail -n 200 /app/logs/backend.log || true
     exit 1
 fi
 
+# tini 只把停止信号转发给本脚本：转发给所有 worker 并等待它们排空退出，nginx 在此期间继续转发已有流程的请求，最后再退出
+shutdown() {
+    trap - TERM INT
+    echo "Stopping backend workers..."
+    kill -TERM ${WORKER_PIDS} 2>/dev/null || true
+    for pid in ${WORKER_PIDS}; do
+        wait "$pid" 2>/dev/null || true
+    done
+    echo "Stopping Nginx..."
+    nginx -s quit 2>/dev/null || true
+    wait "${NGINX_PID}" 2>/dev/null || true
+    exit 0
+}
+trap shutdown TERM INT
+
 echo "Starting Nginx..."
-nginx -t && nginx -g "daemon off;"
+nginx -t
+nginx -g "daemon off;" &
+NGINX_PID=$!
+wait "${NGINX_PID}"
 